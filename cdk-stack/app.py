@@ -3,10 +3,16 @@
 import aws_cdk as cdk
 
 from cdk_stack.cdk_stack_stack import CdkStackStack
+from cdk_stack.shared_lambda_deps_stack import SharedLambdaDeps
 
 
 app = cdk.App()
-CdkStackStack(app, "CdkStackStack",
+# Lambda layer and role shared by the application stacks
+shared_lambda_deps = SharedLambdaDeps(app, "SharedLambdaDeps",
+    env=cdk.Environment(account='021891619017', region='us-west-2'),
+    )
+
+cdk_stack = CdkStackStack(app, "CdkStackStack",
     # If you don't specify 'env', this stack will be environment-agnostic.
     # Account/Region-dependent features and context lookups will not work,
     # but a single synthesized template can be deployed anywhere.
@@ -23,5 +29,6 @@ CdkStackStack(app, "CdkStackStack",
 
     # For more information, see https://docs.aws.amazon.com/cdk/latest/guide/environments.html
     )
+cdk_stack.add_dependency(shared_lambda_deps)
 
 app.synth()
@@ -3,21 +3,31 @@ from aws_cdk import (
     Stack,
     aws_lambda as _lambda,
     aws_dynamodb as dynamodb,
-    aws_apigateway as apigateway,
+    aws_apigatewayv2 as apigwv2,
+    aws_apigatewayv2_integrations as integrations,
     aws_iam as iam,
+    aws_ec2 as ec2,
     aws_s3 as s3,
     aws_cloudfront as cloudfront,
     aws_cloudfront_origins as origins,
-    aws_s3_deployment as s3_deployment,
+    aws_s3_assets as s3_assets,
     aws_route53 as route53,
     aws_certificatemanager as acm,
     aws_route53_targets as targets,
+    aws_ssm as ssm,
+    custom_resources as cr,
+    CustomResource,
+    AssetHashType,
+    Duration,
+    FileSystem,
     RemovalPolicy,
     CfnOutput
 )
 from constructs import Construct
 import os
 
+from cdk_stack.shared_lambda_deps_stack import LAMBDA_LAYER_ARN_PARAMETER, LAMBDA_ROLE_ARN_PARAMETER
+
 # Read the domain name from a file
 try:
     file_path = os.path.join(os.path.dirname(__file__), 'domain_name.txt')
@@ -28,6 +38,9 @@ except FileNotFoundError:
 if not domain_name:
     raise ValueError(f'File {file_path} is empty')
 
+# Local artifacts that should neither ship with a function nor change its asset hash
+LAMBDA_ASSET_EXCLUDES = ['__pycache__', '*.pyc', '.pytest_cache', 'tests', '*.md']
+
 class CdkStackStack(Stack):
     """
     This AWS CDK stack defines the infrastructure resources required for a serverless application,
@@ -38,22 +51,32 @@ class CdkStackStack(Stack):
       - 'Metadata' for storing application metadata
       - 'Foods' for storing food-related data
       - 'Users' for storing user data
-    - A Lambda layer containing dependencies for the Lambda function
-    - An IAM role and policy for the Lambda function to access DynamoDB tables
-    - A Lambda function named 'FoodSuggestionFunction' to interact with the DynamoDB tables
-    - An API Gateway REST API with resources and methods (GET, PUT, DELETE, POST)
+    - A policy granting the shared Lambda role (see SharedLambdaDeps, which also
+      provides the dependency layer) access to the DynamoDB tables
+    - A VPC with isolated subnets and a DynamoDB gateway endpoint for the Lambda function
+    - A Lambda function named 'FoodSuggestionFunction' to interact with the DynamoDB tables,
+      published with SnapStart behind a 'live' alias
+    - An API Gateway HTTP API with an ANY route and a batch route
       to invoke the Lambda function for storage interactions
-    - An S3 bucket to store and serve a React application, configured with CloudFront
-      for content delivery
-    - A CloudFront distribution to serve the frontend with caching and secure access
+    - A private S3 bucket to store the React application, read by CloudFront through
+      origin access control
+    - A CloudFront distribution to serve the frontend with caching and secure access,
+      which also fronts the API, caches batch GET responses and answers CORS at the edge
+    - A custom resource that copies each build into its own versioned prefix of the
+      bucket, marking hashed assets immutable, before CloudFront's origin path is switched
 
-    The stack is configured to remove all resources when deleted (for testing purposes).
-    This removal policy should be removed for production deployments.
+    By default the stack removes all resources when deleted (for testing purposes).
+    Deploying with `-c prod=true` retains the tables and bucket instead and skips the
+    custom resource that empties the bucket.
     """
 
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Production deployments keep their data when the stack is deleted
+        is_prod = str(self.node.try_get_context('prod')).lower() == 'true'
+        removal_policy = RemovalPolicy.RETAIN if is_prod else RemovalPolicy.DESTROY
+
         # Create a table Food data
         food = dynamodb.Table(
             self, 'Foods',
@@ -62,7 +85,8 @@ class CdkStackStack(Stack):
                 name='id',
                 type=dynamodb.AttributeType.STRING
             ),
-            removal_policy=RemovalPolicy.DESTROY,  # for testing purposes, remove for production
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=removal_policy,
         )
 
         # Create a table for user data
@@ -73,80 +97,115 @@ class CdkStackStack(Stack):
                 name='id',
                 type=dynamodb.AttributeType.STRING
             ),
-            removal_policy=RemovalPolicy.DESTROY,  # for testing purposes, remove for production
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=removal_policy,
         )
 
-        # Create Lambda Layer to house dependencies
-        dependency = _lambda.LayerVersion(
+        # Import the Lambda Layer housing dependencies from the SharedLambdaDeps stack
+        dependency = _lambda.LayerVersion.from_layer_version_arn(
             self, 'LambdaLayer',
-            code=_lambda.Code.from_asset('lambda_layer.zip'),
-            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],
-            description='A Lambda layer containing dependencies'
+            ssm.StringParameter.value_for_string_parameter(self, LAMBDA_LAYER_ARN_PARAMETER)
         )
 
-        # Create IAM role for Lambda function
-        food_suggestion_function_role = iam.Role(
+        # Import the IAM role for the Lambda function from the SharedLambdaDeps stack
+        food_suggestion_function_role = iam.Role.from_role_arn(
             self, "FoodSuggestionFunctionRole",
-            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-            managed_policies=[
-                iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")
-            ]
+            ssm.StringParameter.value_for_string_parameter(self, LAMBDA_ROLE_ARN_PARAMETER)
         )
 
-        # Create a custom IAM policy for the Lambda
-        food_suggestion_function_policy = iam.Policy(
-            self, 'FoodSuggestionFunctionPolicy',
-            policy_name='FoodSuggestionFunctionPolicy',
-            statements=[
-                iam.PolicyStatement(
-                    actions=[
-                        "dynamodb:GetItem",
-                        "dynamodb:PutItem",
-                        "dynamodb:UpdateItem",
-                        "dynamodb:DeleteItem",
-                        "dynamodb:Scan",
-                        "dynamodb:Query"
-                    ],
-                    resources=[
-                        f"arn:aws:dynamodb:{self.region}:{self.account}:table/Metadata",
-                        f"arn:aws:dynamodb:{self.region}:{self.account}:table/Foods",
-                        f"arn:aws:dynamodb:{self.region}:{self.account}:table/Users"
-                    ]
-                )
+        # Grant the Lambda read/write access scoped to the tables it uses
+        food.grant_read_write_data(food_suggestion_function_role)
+        user.grant_read_write_data(food_suggestion_function_role)
+
+        # VPC without NAT gateways, DynamoDB is reached through a gateway endpoint
+        # so Lambda traffic to the tables stays on the AWS network
+        lambda_vpc = ec2.Vpc(
+            self, 'LambdaVpc',
+            nat_gateways=0,
+            subnet_configuration=[
+                ec2.SubnetConfiguration(name='Isolated', subnet_type=ec2.SubnetType.PRIVATE_ISOLATED)
             ]
         )
-
-        # Attach the policy to the Lambda function's role
-        food_suggestion_function_role.attach_inline_policy(food_suggestion_function_policy)
+        lambda_vpc.add_gateway_endpoint(
+            'DynamoDbEndpoint',
+            service=ec2.GatewayVpcEndpointAwsService.DYNAMODB
+        )
 
         # Lambda function to interact with DynamoDB
         food_suggestion_function = _lambda.Function(
             self, 'FoodSuggestionFunction',
             runtime=_lambda.Runtime.PYTHON_3_12,
             handler='food_suggestion_function.handler',
-            code=_lambda.Code.from_asset('lambda_functions'),
+            code=_lambda.Code.from_asset('lambda_functions',
+                exclude=LAMBDA_ASSET_EXCLUDES, # keep local artifacts out of the asset hash
+                asset_hash_type=AssetHashType.SOURCE
+            ),
             layers=[dependency],
-            role=food_suggestion_function_role
+            role=food_suggestion_function_role,
+            vpc=lambda_vpc,
+            vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_ISOLATED),
+            architecture=_lambda.Architecture.ARM_64, # Graviton, cheaper per ms
+            memory_size=1024, # more memory also means more vCPU for JSON parsing and request signing
+            timeout=Duration.seconds(10),
+            # Restore initialized boto3 clients from a snapshot instead of re-creating them on cold start
+            snap_start=_lambda.SnapStartConf.ON_PUBLISHED_VERSIONS
+        )
+
+        # The shared layer ARN is only resolved at deploy time, so tie the published
+        # version to the layer contents to publish a new version when the layer changes
+        food_suggestion_function.invalidate_version_based_on(FileSystem.fingerprint('lambda_layer.zip'))
+
+        # SnapStart only applies to published versions, so the API targets an alias
+        food_suggestion_alias = _lambda.Alias(
+            self, 'FoodSuggestionFunctionAlias',
+            alias_name='live',
+            version=food_suggestion_function.current_version
         )
 
-        # Create the API Gateway with CORS enabled
-        api_gateway = apigateway.LambdaRestApi(
+        # Create the HTTP API, CORS headers are set by CloudFront and preflights answered here
+        http_api = apigwv2.HttpApi(
             self, 'AwsSiteApiGateway',
-            handler=food_suggestion_function,
-            proxy=False,
-            default_cors_preflight_options={
-                "allow_origins": apigateway.Cors.ALL_ORIGINS,
-                "allow_methods": apigateway.Cors.ALL_METHODS,
-                "allow_headers": apigateway.Cors.DEFAULT_HEADERS
-            }
+            cors_preflight=apigwv2.CorsPreflightOptions(
+                allow_origins=["*"],
+                allow_methods=[apigwv2.CorsHttpMethod.ANY],
+                allow_headers=["*"]
+            )
+        )
+
+        # Payload format 1.0 keeps the REST API event shape (httpMethod, resource, ...) the handler reads
+        food_suggestion_integration = integrations.HttpLambdaIntegration(
+            'FoodSuggestionIntegration', food_suggestion_alias,
+            payload_format_version=apigwv2.PayloadFormatVersion.VERSION_1_0
         )
 
-        # Define a resource and method for the API
-        food_suggestion_resource = api_gateway.root.add_resource("food_suggestion") # /food_suggestion
-        food_suggestion_resource.add_method("GET")
-        food_suggestion_resource.add_method("PUT")
-        food_suggestion_resource.add_method("DELETE")
-        food_suggestion_resource.add_method("POST")
+        # Define the routes for the API
+        food_suggestion_path = "/food_suggestion"
+        http_api.add_routes(
+            path=food_suggestion_path,
+            methods=[apigwv2.HttpMethod.ANY], # the Lambda dispatches on the HTTP method itself
+            integration=food_suggestion_integration
+        )
+        # Bulk reads and writes, one DynamoDB batch call per 25 (write) or 100 (read) items
+        http_api.add_routes(
+            path=f"{food_suggestion_path}/batch",
+            methods=[apigwv2.HttpMethod.GET, apigwv2.HttpMethod.POST],
+            integration=food_suggestion_integration
+        )
+
+        # Seconds CloudFront caches batch GET responses for, tune with `cdk deploy -c api_cache_ttl_seconds=N`.
+        # Only the id-keyed batch reads are cacheable, random_food and food_suggestions
+        # must be fresh for every caller and are never cached
+        api_cache_ttl_seconds = self.node.try_get_context('api_cache_ttl_seconds')
+        api_cache_ttl_seconds = 60 if api_cache_ttl_seconds is None else int(api_cache_ttl_seconds)
+        if api_cache_ttl_seconds > 0:
+            api_cache_policy = cloudfront.CachePolicy(self, "ApiCachePolicy",
+                default_ttl=Duration.seconds(api_cache_ttl_seconds),
+                min_ttl=Duration.seconds(0),
+                max_ttl=Duration.seconds(api_cache_ttl_seconds),
+                query_string_behavior=cloudfront.CacheQueryStringBehavior.allow_list("ids")
+            )
+        else:
+            api_cache_policy = cloudfront.CachePolicy.CACHING_DISABLED
 
         # Hosted Zone
         zone = route53.HostedZone.from_lookup(self, "HostedZone",
@@ -156,11 +215,9 @@ class CdkStackStack(Stack):
         # Medium Create S3 Bucket to store the React App
         site_bucket = s3.Bucket(self, "SiteBucket", # TODO change to ReactApplicationBucket
             bucket_name=f'{domain_name}.{domain_name}', # TODO fix this
-            website_index_document="index.html",
-            public_read_access=True,
-            block_public_access=s3.BlockPublicAccess(block_public_acls=False, block_public_policy=False),
-            removal_policy=RemovalPolicy.DESTROY,
-            auto_delete_objects=True # for testing purposes, remove for production
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL, # only CloudFront reads, via origin access control
+            removal_policy=removal_policy,
+            auto_delete_objects=not is_prod # only for testing, avoids the bucket-emptying custom resource in prod
         )
 
         # Create Certificate
@@ -170,30 +227,127 @@ class CdkStackStack(Stack):
             region="us-east-1"  # standard for ACM certs
         )
 
-        # # Create Certificate
-        # site_certificate = acm.Certificate(self, "SiteCertificate",
-        #     domain_name=f'{subdomain_name}.{domain_name}',
-        #     validation=acm.CertificateValidation.from_dns(zone)
-        # )
+        # Upload the React build as an asset for the sync function to copy into the bucket
+        site_asset = s3_assets.Asset(self, "SiteAsset",
+            path="../aws-site-frontend/build"
+        )
+        # Each build is deployed under its own prefix and CloudFront is pointed at it afterwards,
+        # so viewers never see a half-uploaded build and rolling back is an origin path change
+        site_version_prefix = f"v/{site_asset.asset_hash}"
+
+        # Lambda function to copy the build into its versioned prefix
+        site_sync_function = _lambda.Function(
+            self, 'SiteSyncFunction',
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            handler='site_sync_function.handler',
+            code=_lambda.Code.from_asset('site_sync',
+                exclude=LAMBDA_ASSET_EXCLUDES,
+                asset_hash_type=AssetHashType.SOURCE
+            ),
+            memory_size=512,
+            timeout=Duration.minutes(15)
+        )
+        site_asset.grant_read(site_sync_function)
+        site_bucket.grant_read_write(site_sync_function)
+
+        # Deploy site to S3, re-run whenever the build asset changes
+        site_sync_provider = cr.Provider(self, "SiteSyncProvider",
+            on_event_handler=site_sync_function
+        )
+        site_sync = CustomResource(self, "SiteSync",
+            service_token=site_sync_provider.service_token,
+            properties={
+                "SourceBucketName": site_asset.s3_bucket_name,
+                "SourceObjectKey": site_asset.s3_object_key,
+                "DestinationBucketName": site_bucket.bucket_name,
+                "DestinationPrefix": site_version_prefix,
+                # Hashed files under static/ never change in place, so they can be cached forever
+                "HashedAssetCacheControl": "public, max-age=31536000, immutable",
+                "DefaultCacheControl": "no-cache"
+            }
+        )
+
+        # CORS headers added at the edge for the API behavior
+        api_cors_policy = cloudfront.ResponseHeadersPolicy(self, "ApiCorsPolicy",
+            cors_behavior=cloudfront.ResponseHeadersCorsBehavior(
+                access_control_allow_origins=["*"],
+                access_control_allow_methods=["GET", "PUT", "POST", "DELETE", "OPTIONS"],
+                access_control_allow_headers=["*"],
+                access_control_allow_credentials=False,
+                origin_override=True
+            )
+        )
+
+        # Serve the React app for client-side routes, extension-less paths are rewritten
+        # to index.html on the S3 behavior only so API errors reach the client unchanged
+        spa_rewrite_function = cloudfront.Function(self, "SpaRewriteFunction",
+            runtime=cloudfront.FunctionRuntime.JS_2_0,
+            code=cloudfront.FunctionCode.from_inline(
+                "function handler(event) {\n"
+                "    var request = event.request;\n"
+                "    if (!request.uri.split('/').pop().includes('.')) {\n"
+                "        request.uri = '/index.html';\n"
+                "    }\n"
+                "    return request;\n"
+                "}"
+            )
+        )
+
+        api_origin = origins.HttpOrigin(f"{http_api.api_id}.execute-api.{self.region}.{self.url_suffix}")
 
         # Create CloudFront Distribution
-        site_distribution = cloudfront.CloudFrontWebDistribution(self, "SiteDistribution",
-            viewer_certificate=cloudfront.ViewerCertificate.from_acm_certificate(
-                certificate=site_certificate,
-                aliases=[domain_name],
-                security_policy=cloudfront.SecurityPolicyProtocol.TLS_V1_2_2021,
+        site_distribution = cloudfront.Distribution(self, "SiteDistribution",
+            certificate=site_certificate,
+            domain_names=[domain_name],
+            minimum_protocol_version=cloudfront.SecurityPolicyProtocol.TLS_V1_2_2021,
+            default_root_object="index.html",
+            http_version=cloudfront.HttpVersion.HTTP2_AND_3, # QUIC for viewers that support it
+            enable_ipv6=True,
+            price_class=cloudfront.PriceClass.PRICE_CLASS_100,
+            default_behavior=cloudfront.BehaviorOptions(
+                # Origin access control signs origin requests with SigV4 and adds the bucket policy
+                origin=origins.S3BucketOrigin.with_origin_access_control(site_bucket,
+                    origin_path=f"/{site_version_prefix}"
+                ),
+                compress=True, # Brotli/Gzip for the JS/CSS/HTML bundle
+                cache_policy=cloudfront.CachePolicy.CACHING_OPTIMIZED,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                response_headers_policy=cloudfront.ResponseHeadersPolicy.SECURITY_HEADERS,
+                function_associations=[cloudfront.FunctionAssociation(
+                    function=spa_rewrite_function,
+                    event_type=cloudfront.FunctionEventType.VIEWER_REQUEST
+                )]
             ),
-            origin_configs=[
-                cloudfront.SourceConfiguration(
-                    custom_origin_source=cloudfront.CustomOriginConfig(
-                        domain_name=site_bucket.bucket_website_domain_name,
-                        origin_protocol_policy=cloudfront.OriginProtocolPolicy.HTTP_ONLY
-                    ),
-                    behaviors=[cloudfront.Behavior(is_default_behavior=True)]
+            # Route the API through the same domain so the React app's calls are same-origin,
+            # behaviors are matched in order so the batch path is listed first
+            additional_behaviors={
+                f"{food_suggestion_path}/batch": cloudfront.BehaviorOptions(
+                    origin=api_origin,
+                    allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                    cache_policy=api_cache_policy, # only GET/HEAD responses are cached
+                    origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.HTTPS_ONLY,
+                    response_headers_policy=api_cors_policy
+                ),
+                f"{food_suggestion_path}*": cloudfront.BehaviorOptions(
+                    origin=api_origin,
+                    allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                    cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                    origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.HTTPS_ONLY,
+                    response_headers_policy=api_cors_policy
                 )
-            ]
+            }
         )
 
+        # Keep the logical ID of the CloudFrontWebDistribution this replaced, so CloudFormation
+        # updates the live distribution in place rather than creating a second one that
+        # fails with CNAMEAlreadyExists on the shared domain name
+        site_distribution.node.default_child.override_logical_id("SiteDistributionCFDistribution209CF7F5")
+
+        # Switch the origin path only once the new version is fully uploaded
+        site_distribution.node.add_dependency(site_sync)
+
         # Route 53 Alias Records for CloudFront
         route53.ARecord(self, "AliasRecord",
             zone=zone,
@@ -207,20 +361,6 @@ class CdkStackStack(Stack):
             record_name=f"www.{domain_name}"
         )
 
-        # Deploy site to S3
-        s3_deployment.BucketDeployment(self, "BucketDeployment",
-            sources=[s3_deployment.Source.asset("../aws-site-frontend/build")],
-            destination_bucket=site_bucket,
-            distribution=site_distribution,
-            distribution_paths=["/*"]
-        )
-
         # # Output the URLs
-        CfnOutput(self, "ApiUrl", value=api_gateway.url)
-        CfnOutput(self, "ApiResourcePath", value=food_suggestion_resource.path)
-
-
-
-
-
-
+        CfnOutput(self, "ApiUrl", value=f"https://{domain_name}/")
+        CfnOutput(self, "ApiResourcePath", value=food_suggestion_path)
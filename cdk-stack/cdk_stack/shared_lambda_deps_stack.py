@@ -0,0 +1,63 @@
+"""Module providing Lambda resources shared by the application stacks"""
+from aws_cdk import (
+    Stack,
+    AssetHashType,
+    RemovalPolicy,
+    aws_lambda as _lambda,
+    aws_iam as iam,
+    aws_ssm as ssm
+)
+from constructs import Construct
+
+# SSM parameters the application stacks read the shared resource ARNs from
+LAMBDA_LAYER_ARN_PARAMETER = '/shared-lambda-deps/layer-arn'
+LAMBDA_ROLE_ARN_PARAMETER = '/shared-lambda-deps/role-arn'
+
+class SharedLambdaDeps(Stack):
+    """
+    This AWS CDK stack defines the Lambda dependencies shared across stacks, so they are
+    uploaded and created once rather than once per stack.
+
+    The resources created include:
+    - A Lambda layer containing dependencies for the Lambda functions
+    - An IAM role for the Lambda functions with basic execution and VPC access
+    - SSM parameters publishing the layer and role ARNs
+
+    The ARNs are published through SSM rather than CloudFormation exports: every layer
+    change creates a new LayerVersion ARN, and an export cannot be updated while another
+    stack imports it.
+    """
+
+    def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        # Create Lambda Layer to house dependencies
+        dependency = _lambda.LayerVersion(
+            self, 'LambdaLayer',
+            code=_lambda.Code.from_asset('lambda_layer.zip', asset_hash_type=AssetHashType.SOURCE),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],
+            compatible_architectures=[_lambda.Architecture.ARM_64],
+            description='A Lambda layer containing dependencies',
+            # Other stacks still reference the old version until they update, and roll back to it on failure
+            removal_policy=RemovalPolicy.RETAIN
+        )
+
+        # Create IAM role for Lambda functions, table access is granted by the consuming stack
+        function_role = iam.Role(
+            self, "FoodSuggestionFunctionRole",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole"),
+                iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaVPCAccessExecutionRole")
+            ]
+        )
+
+        # Publish the ARNs for other stacks
+        ssm.StringParameter(self, 'LambdaLayerArn',
+            parameter_name=LAMBDA_LAYER_ARN_PARAMETER,
+            string_value=dependency.layer_version_arn
+        )
+        ssm.StringParameter(self, 'LambdaRoleArn',
+            parameter_name=LAMBDA_ROLE_ARN_PARAMETER,
+            string_value=function_role.role_arn
+        )
@@ -1,34 +1,62 @@
 """Module for retrieving and sending JSON formatted content"""
 import json
+from decimal import Decimal
 """AWS Module for interacting with AWS resources"""
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from cachetools import TTLCache, cached
 import logging
 import random
 import math
+import time
 
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize a DynamoDB session
-dynamodb = boto3.resource('dynamodb')
+# Initialize a DynamoDB session at module level so SnapStart snapshots it
+# and warm invocations reuse the kept-alive connection
+dynamodb = boto3.resource('dynamodb', config=Config(tcp_keepalive=True))
 # Create table object
 table = dynamodb.Table('Metadata')
 food_table = dynamodb.Table('Foods')
 user_table = dynamodb.Table('Users')
 
+# Draw from the OS entropy pool: a module-level random seed would be captured in the
+# SnapStart snapshot and every restored environment would pick the same "random" foods
+system_random = random.SystemRandom()
+
+# DynamoDB request limit and retry settings for batch reads, writes go through batch_writer()
+BATCH_GET_LIMIT = 100
+MAX_BATCH_RETRIES = 5
+# The batch route is public, so only food items with known attributes can be written
+BATCHABLE_TABLES = ('Foods',)
+
+@cached(TTLCache(maxsize=1, ttl=60))
+def scan_food_table() -> list:
+    """
+    Returns every item in the 'Foods' table.
+
+    The food catalogue rarely changes, so the scan is cached in the module for 60 seconds
+    and warm invocations skip the round trip to DynamoDB.
+    """
+    return food_table.scan().get('Items', [])
+
 def handler(event, context):
     '''
     Delegate function to handle incoming HTTP requests based on the HTTP method.
     This function supports POST, GET, PUT, and DELETE operations.
+    Requests to the /batch sub-resource are delegated to batch().
     '''
     http_method = event['httpMethod']
     logger.info(f"htttpMethod: {http_method}")
 
     try:
-        if http_method == 'POST':
+        if event.get('resource', '').endswith('/batch'):
+            return batch(http_method, event)
+        elif http_method == 'POST':
             body = json.loads(event['body'])
             logger.info(f'Event body: {body}')
             return post(body)
@@ -214,6 +242,94 @@ def delete(body: dict) -> dict:
 # def put(key, update_expression, expression_attribute_values):
     # TODO
 
+def batch(http_method: str, event: dict) -> dict:
+    """
+    Handles bulk requests so many items cost one DynamoDB call per batch instead of one per item.
+
+    POST expects a body of {"table": "Foods", "items": [...]} and writes every item.
+    GET expects an "ids" query parameter of comma separated food ids and returns those foods.
+    """
+    try:
+        if http_method == 'POST':
+            # DynamoDB rejects floats, so fractional numbers are parsed as Decimal
+            body = json.loads(event['body'], parse_float=Decimal)
+            error = validate_batch_body(body)
+            if error:
+                return format_bad_request_response(error)
+            # batch_writer() chunks into 25 item requests, retries UnprocessedItems and
+            # drops duplicate keys, which would otherwise fail the whole request
+            with food_table.batch_writer(overwrite_by_pkeys=['id']) as writer:
+                for item in body['items']:
+                    writer.put_item(Item=item)
+            scan_food_table.cache_clear()
+            return format_successful_response({'message': f"Wrote {len(body['items'])} items"})
+        elif http_method == 'GET':
+            food_ids = parse_batch_ids(event.get('queryStringParameters'))
+            if not food_ids:
+                return format_bad_request_response("Missing ids query parameter")
+            foods = batch_get_items('Foods', [{'id': food_id} for food_id in food_ids])
+            return format_successful_response({'items': foods})
+        else:
+            return format_unsuccessful_response('Unsupported HTTP method')
+    except ClientError as e:
+        return format_unsuccessful_response(e)
+    except Exception as e:
+        return format_unsuccessful_response(e)
+
+def validate_batch_body(body) -> str:
+    """
+    Checks a batch POST body before anything is written.
+
+    Returns:
+        str: A message describing the first problem found, or None if the body is valid.
+    """
+    if not isinstance(body, dict):
+        return "Body must be a JSON object"
+    table_name = body.get('table')
+    if table_name not in BATCHABLE_TABLES:
+        return f"Invalid table {table_name}"
+    items = body.get('items')
+    if not isinstance(items, list) or not items:
+        return "items must be a non-empty list"
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('id'), str) or not item['id']:
+            return "Every item must be an object with a string id"
+        unknown_attributes = set(item) - set(map_food_to_user) - {'id'}
+        if unknown_attributes:
+            return f"Unknown attributes {sorted(unknown_attributes)}"
+    return None
+
+def parse_batch_ids(query_params: dict) -> list:
+    """
+    Returns the unique, non-empty ids of a comma separated "ids" query parameter in request order.
+
+    BatchGetItem fails the whole request on duplicate or empty keys, so both are dropped here.
+    """
+    ids = (query_params or {}).get('ids') or ''
+    return list(dict.fromkeys(food_id.strip() for food_id in ids.split(',') if food_id.strip()))
+
+def batch_get_items(table_name: str, keys: list) -> list:
+    """
+    Gets items with BatchGetItem in chunks of 100, retrying UnprocessedKeys
+    with exponential backoff.
+
+    Raises:
+        RuntimeError: If keys are still unprocessed after MAX_BATCH_RETRIES attempts.
+    """
+    items = []
+    for i in range(0, len(keys), BATCH_GET_LIMIT):
+        request_items = {table_name: {'Keys': keys[i:i + BATCH_GET_LIMIT]}}
+        for attempt in range(MAX_BATCH_RETRIES):
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            items.extend(response['Responses'].get(table_name, []))
+            request_items = response.get('UnprocessedKeys')
+            if not request_items:
+                break
+            time.sleep(0.05 * 2 ** attempt)
+        else:
+            raise RuntimeError(f"Unprocessed keys remain for {table_name} after {MAX_BATCH_RETRIES} attempts")
+    return items
+
 
 def add_food_data() -> None:
 
@@ -224,10 +340,12 @@ def add_food_data() -> None:
     logger.info(food_data)
     if food_data:
         logger.info('Adding food data to the Foods table')
-        # Insert each food item into the 'Foods' table
-        for food in food_data:
-            food_table.put_item(Item=food)
-            logger.info(f"Added {food['id']} to the Foods table")
+        # Insert the food items into the 'Foods' table in batches
+        with food_table.batch_writer(overwrite_by_pkeys=['id']) as writer:
+            for food in food_data:
+                writer.put_item(Item=food)
+        logger.info(f"Added {len(food_data)} items to the Foods table")
+        scan_food_table.cache_clear()
 
 def add_user_data() -> None:
 
@@ -238,10 +356,17 @@ def add_user_data() -> None:
     logger.info(user_data)
     if user_data:
         logger.info('Adding user data to the user table')
-        # Insert each food item into the 'Foods' table
-        for user in user_data:
-            user_table.put_item(Item=user)
-            logger.info(f"Added {user['id']} to the Foods table")
+        # Insert the user items into the 'Users' table in batches
+        with user_table.batch_writer(overwrite_by_pkeys=['id']) as writer:
+            for user in user_data:
+                writer.put_item(Item=user)
+        logger.info(f"Added {len(user_data)} items to the Users table")
+
+def decimal_to_number(value):
+    """json.dumps default for the Decimal values boto3 returns for DynamoDB numbers."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 def format_successful_response(data: dict) -> dict:
     response = {
@@ -251,7 +376,20 @@ def format_successful_response(data: dict) -> dict:
             'Access-Control-Allow-Headers': 'Content-Type',
             'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
         },
-        'body': json.dumps(data)
+        'body': json.dumps(data, default=decimal_to_number)
+    }
+    return response
+
+def format_bad_request_response(message: str) -> dict:
+    logger.info(message)
+    response = {
+        'statusCode': 400,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+        },
+        'body': json.dumps(f"Error: {message}")
     }
     return response
 
@@ -272,14 +410,12 @@ def get_random_food() -> dict:
     """Returns a random food item from the 'Foods' table."""
     number_of_food_items_returned = 3
     try:
-        # Use the scan operation to retrieve all items from the table
-        response = food_table.scan()
-        # Get the list of items from the response
-        foods = response['Items']
+        # Retrieve all items from the table
+        foods = scan_food_table()
         if len(foods) < number_of_food_items_returned:
             return format_unsuccessful_response("Not enough food items in the table")
         # Randomly select an item from the list
-        random_items = random.sample(foods, number_of_food_items_returned)
+        random_items = system_random.sample(foods, number_of_food_items_returned)
         random_item_ids = {}
         for i, random_item in enumerate(random_items, start=1):
             logger.info(random_item['id'])
@@ -354,7 +490,7 @@ def get_food_suggestions():
         selected_foods = user_item.get('selectedFoods', [])
 
         # Get all food items
-        food_items = food_table.scan().get('Items', [])
+        food_items = scan_food_table()
 
         if not food_items:
             return format_unsuccessful_response("No food items found.")
@@ -420,7 +556,7 @@ def get_food_suggestions_test():
         preferences = user_item.get('preferences', {})
         selected_foods = set(user_item.get('selectedFoods', []))
 
-        food_items = food_table.scan().get('Items', [])
+        food_items = scan_food_table()
         if not food_items:
             return format_unsuccessful_response("No food items found.")
 
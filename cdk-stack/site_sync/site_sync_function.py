@@ -0,0 +1,153 @@
+"""Custom resource handler that copies the React build into a versioned prefix of the site bucket"""
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import zipfile
+
+import boto3
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3 = boto3.client('s3')
+
+# React emits content-hashed filenames under this prefix
+HASHED_ASSET_PREFIX = 'static/'
+# Object metadata marking hashed assets carried over from an earlier version
+CARRIED_METADATA_KEY = 'carried'
+
+
+def handler(event, context):
+    '''
+    Entry point for the custom resource provider.
+
+    On Create/Update the build asset is written under DestinationPrefix. Files that
+    are unchanged since the previous version are copied server side from its prefix,
+    so only new or modified files are uploaded. Hashed assets of the previous version
+    that the new build no longer has are copied across too, so viewers still running
+    the previous index.html can lazy-load its chunks once the origin path switches.
+    Earlier versions are left in place so CloudFront keeps serving them until its
+    origin path is switched, and so a rollback only needs the origin path pointed back.
+
+    Hashed assets under static/ get an immutable Cache-Control; everything else
+    (index.html, manifest, ...) is served no-cache. The viewer-facing paths do not
+    change between versions, so no CloudFront invalidation is needed.
+    Delete is a no-op, the bucket's own removal policy handles its objects.
+    '''
+    request_type = event['RequestType']
+    properties = event['ResourceProperties']
+    logger.info(f"RequestType: {request_type}")
+
+    physical_id = event.get('PhysicalResourceId', f"{properties['DestinationBucketName']}-sync")
+    if request_type == 'Delete':
+        return {'PhysicalResourceId': physical_id}
+
+    cache_control = {
+        'hashed': properties['HashedAssetCacheControl'],
+        'default': properties['DefaultCacheControl']
+    }
+    previous_prefix = event.get('OldResourceProperties', {}).get('DestinationPrefix')
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        local_files = extract_asset(properties['SourceBucketName'], properties['SourceObjectKey'], work_dir)
+        uploaded_keys = sync(local_files, properties['DestinationBucketName'],
+                             properties['DestinationPrefix'], previous_prefix, cache_control)
+
+    return {'PhysicalResourceId': physical_id, 'Data': {'UploadedObjects': len(uploaded_keys)}}
+
+
+def extract_asset(bucket: str, key: str, work_dir: str) -> dict:
+    """
+    Downloads and extracts the zipped build asset.
+
+    Returns:
+        dict: Object key -> local file path for every file in the build.
+    """
+    archive = os.path.join(work_dir, 'asset.zip')
+    contents = os.path.join(work_dir, 'contents')
+    s3.download_file(bucket, key, archive)
+    with zipfile.ZipFile(archive) as zip_file:
+        zip_file.extractall(contents)
+
+    local_files = {}
+    for root, _, files in os.walk(contents):
+        for name in files:
+            path = os.path.join(root, name)
+            local_files[os.path.relpath(path, contents).replace(os.sep, '/')] = path
+    return local_files
+
+
+def list_remote_etags(bucket: str, prefix: str) -> dict:
+    """Returns key (relative to prefix) -> ETag for every object under the prefix."""
+    remote = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f'{prefix}/'):
+        for obj in page.get('Contents', []):
+            remote[obj['Key'][len(prefix) + 1:]] = obj['ETag'].strip('"')
+    return remote
+
+
+def sync(local_files: dict, bucket: str, prefix: str, previous_prefix: str, cache_control: dict) -> list:
+    """
+    Writes every file of the build under prefix, without deleting anything.
+
+    Files are compared by MD5 against the previous version's ETags (objects are always
+    written with a single put_object, so the ETag is the MD5 of the body). Unchanged
+    files are copied within S3 instead of uploaded. Comparing by size alone would miss
+    same-length edits such as index.html pointing at freshly hashed chunks.
+    Hashed assets only the previous version has are carried into prefix as well,
+    except those it had carried over itself, so each version holds at most its own
+    and its predecessor's chunks.
+
+    Args:
+        previous_prefix (str): Prefix of the currently deployed version, or None.
+        cache_control (dict): Cache-Control values keyed 'hashed' and 'default'.
+
+    Returns:
+        list: The keys that had to be uploaded.
+    """
+    previous = list_remote_etags(bucket, previous_prefix) if previous_prefix else {}
+    uploaded_keys = []
+
+    for key, path in local_files.items():
+        with open(path, 'rb') as file:
+            body = file.read()
+        headers = {
+            'ContentType': mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            'CacheControl': cache_control['hashed'] if key.startswith(HASHED_ASSET_PREFIX) else cache_control['default']
+        }
+        if previous.get(key) == hashlib.md5(body).hexdigest():
+            s3.copy_object(
+                Bucket=bucket,
+                Key=f'{prefix}/{key}',
+                CopySource={'Bucket': bucket, 'Key': f'{previous_prefix}/{key}'},
+                MetadataDirective='REPLACE', # re-apply headers in case the cache policy changed
+                **headers
+            )
+            continue
+        s3.put_object(Bucket=bucket, Key=f'{prefix}/{key}', Body=body, **headers)
+        logger.info(f"Uploaded {key}")
+        uploaded_keys.append(key)
+
+    # Keep the previous build's chunks reachable for viewers that loaded its index.html
+    for key in previous:
+        if not key.startswith(HASHED_ASSET_PREFIX) or key in local_files:
+            continue
+        metadata = s3.head_object(Bucket=bucket, Key=f'{previous_prefix}/{key}').get('Metadata', {})
+        if CARRIED_METADATA_KEY in metadata:
+            continue # an older version's chunk, no viewer of the previous index.html requests it
+        s3.copy_object(
+            Bucket=bucket,
+            Key=f'{prefix}/{key}',
+            CopySource={'Bucket': bucket, 'Key': f'{previous_prefix}/{key}'},
+            MetadataDirective='REPLACE',
+            Metadata={CARRIED_METADATA_KEY: 'true'},
+            ContentType=mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            CacheControl=cache_control['hashed']
+        )
+        logger.info(f"Carried over {key}")
+
+    return uploaded_keys
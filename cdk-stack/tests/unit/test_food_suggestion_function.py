@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+
+# The Lambda creates its DynamoDB resource at import time and is not a package
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lambda_functions'))
+
+import food_suggestion_function as fsf
+
+
+def batch_event(http_method, body=None, query_params=None):
+    return {
+        'httpMethod': http_method,
+        'resource': '/food_suggestion/batch',
+        'body': body,
+        'queryStringParameters': query_params
+    }
+
+
+def test_parse_batch_ids_dedupes_and_drops_empty_ids():
+    assert fsf.parse_batch_ids({'ids': 'a, b,,a,b '}) == ['a', 'b']
+
+
+def test_parse_batch_ids_handles_missing_ids():
+    assert fsf.parse_batch_ids(None) == []
+    assert fsf.parse_batch_ids({}) == []
+    assert fsf.parse_batch_ids({'ids': ''}) == []
+
+
+def test_batch_get_rejects_missing_ids():
+    response = fsf.handler(batch_event('GET', query_params={'ids': ','}), None)
+    assert response['statusCode'] == 400
+
+
+def test_batch_get_requests_each_id_once():
+    with mock.patch.object(fsf, 'batch_get_items', return_value=[{'id': 'a'}]) as batch_get_items:
+        response = fsf.handler(batch_event('GET', query_params={'ids': 'a,a'}), None)
+    batch_get_items.assert_called_once_with('Foods', [{'id': 'a'}])
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'items': [{'id': 'a'}]}
+
+
+def test_batch_get_items_retries_unprocessed_keys():
+    responses = [
+        {'Responses': {'Foods': [{'id': 'a'}]}, 'UnprocessedKeys': {'Foods': {'Keys': [{'id': 'b'}]}}},
+        {'Responses': {'Foods': [{'id': 'b'}]}, 'UnprocessedKeys': {}}
+    ]
+    with mock.patch.object(fsf.dynamodb, 'batch_get_item', side_effect=responses) as batch_get_item, \
+            mock.patch.object(fsf.time, 'sleep'):
+        items = fsf.batch_get_items('Foods', [{'id': 'a'}, {'id': 'b'}])
+    assert items == [{'id': 'a'}, {'id': 'b'}]
+    batch_get_item.assert_called_with(RequestItems={'Foods': {'Keys': [{'id': 'b'}]}})
+
+
+def test_batch_get_items_chunks_requests():
+    keys = [{'id': str(i)} for i in range(fsf.BATCH_GET_LIMIT + 1)]
+    with mock.patch.object(fsf.dynamodb, 'batch_get_item', return_value={'Responses': {}}) as batch_get_item:
+        fsf.batch_get_items('Foods', keys)
+    assert batch_get_item.call_count == 2
+
+
+def test_batch_post_parses_floats_as_decimal():
+    body = json.dumps({'table': 'Foods', 'items': [{'id': 'Tacos', 'isSpicy': 1.5}]})
+    with mock.patch.object(fsf, 'food_table') as food_table:
+        writer = food_table.batch_writer.return_value.__enter__.return_value
+        response = fsf.handler(batch_event('POST', body=body), None)
+    assert response['statusCode'] == 200
+    food_table.batch_writer.assert_called_once_with(overwrite_by_pkeys=['id'])
+    writer.put_item.assert_called_once_with(Item={'id': 'Tacos', 'isSpicy': Decimal('1.5')})
+
+
+@pytest.mark.parametrize('body', [
+    ['Foods'],
+    {'table': 'Users', 'items': [{'id': 'User123'}]},
+    {'table': ['Foods'], 'items': [{'id': 'Tacos'}]},
+    {'table': 'Foods'},
+    {'table': 'Foods', 'items': []},
+    {'table': 'Foods', 'items': 'Tacos'},
+    {'table': 'Foods', 'items': ['Tacos']},
+    {'table': 'Foods', 'items': [{'isSweet': True}]},
+    {'table': 'Foods', 'items': [{'id': 7}]},
+    {'table': 'Foods', 'items': [{'id': 'Tacos', 'isAdmin': True}]}
+])
+def test_batch_post_rejects_invalid_body(body):
+    with mock.patch.object(fsf, 'food_table') as food_table:
+        response = fsf.handler(batch_event('POST', body=json.dumps(body)), None)
+    assert response['statusCode'] == 400
+    food_table.batch_writer.assert_not_called()
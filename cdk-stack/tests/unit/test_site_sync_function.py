@@ -0,0 +1,75 @@
+import hashlib
+import os
+import sys
+from unittest import mock
+
+# The sync function creates its S3 client at import time and is not a package
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'site_sync'))
+
+import site_sync_function as ssf
+
+CACHE_CONTROL = {'hashed': 'immutable', 'default': 'no-cache'}
+
+
+def write_build(tmp_path, files):
+    local_files = {}
+    for key, body in files.items():
+        path = tmp_path / key.replace('/', '_')
+        path.write_bytes(body)
+        local_files[key] = str(path)
+    return local_files
+
+
+def md5(body):
+    return hashlib.md5(body).hexdigest()
+
+
+def copied_keys(s3):
+    return {call.kwargs['Key']: call.kwargs for call in s3.copy_object.call_args_list}
+
+
+def test_sync_uploads_everything_without_previous_version(tmp_path):
+    local_files = write_build(tmp_path, {'index.html': b'<html>', 'static/js/main.1.js': b'js'})
+    with mock.patch.object(ssf, 's3') as s3:
+        uploaded = ssf.sync(local_files, 'bucket', 'v/new', None, CACHE_CONTROL)
+    assert sorted(uploaded) == ['index.html', 'static/js/main.1.js']
+    s3.copy_object.assert_not_called()
+    headers = {call.kwargs['Key']: call.kwargs['CacheControl'] for call in s3.put_object.call_args_list}
+    assert headers == {'v/new/index.html': 'no-cache', 'v/new/static/js/main.1.js': 'immutable'}
+
+
+def test_sync_copies_unchanged_files_from_previous_version(tmp_path):
+    local_files = write_build(tmp_path, {'index.html': b'<html new>', 'static/js/main.1.js': b'js'})
+    previous = {'index.html': md5(b'<html old>'), 'static/js/main.1.js': md5(b'js')}
+    with mock.patch.object(ssf, 's3') as s3, \
+            mock.patch.object(ssf, 'list_remote_etags', return_value=previous):
+        uploaded = ssf.sync(local_files, 'bucket', 'v/new', 'v/old', CACHE_CONTROL)
+    assert uploaded == ['index.html']
+    copy = copied_keys(s3)['v/new/static/js/main.1.js']
+    assert copy['CopySource'] == {'Bucket': 'bucket', 'Key': 'v/old/static/js/main.1.js'}
+    assert 'Metadata' not in copy
+
+
+def test_sync_carries_previous_chunks_missing_from_build(tmp_path):
+    local_files = write_build(tmp_path, {'index.html': b'<html>'})
+    previous = {'index.html': md5(b'<html old>'), 'static/js/old.2.js': md5(b'old')}
+    with mock.patch.object(ssf, 's3') as s3, \
+            mock.patch.object(ssf, 'list_remote_etags', return_value=previous):
+        s3.head_object.return_value = {'Metadata': {}}
+        ssf.sync(local_files, 'bucket', 'v/new', 'v/old', CACHE_CONTROL)
+    copy = copied_keys(s3)['v/new/static/js/old.2.js']
+    assert copy['CopySource'] == {'Bucket': 'bucket', 'Key': 'v/old/static/js/old.2.js'}
+    assert copy['Metadata'] == {ssf.CARRIED_METADATA_KEY: 'true'}
+    assert copy['CacheControl'] == 'immutable'
+
+
+def test_sync_does_not_carry_chunks_the_previous_version_carried(tmp_path):
+    local_files = write_build(tmp_path, {'index.html': b'<html>'})
+    previous = {'static/js/older.3.js': md5(b'older'), 'asset-manifest.json': md5(b'{}')}
+    with mock.patch.object(ssf, 's3') as s3, \
+            mock.patch.object(ssf, 'list_remote_etags', return_value=previous):
+        s3.head_object.return_value = {'Metadata': {ssf.CARRIED_METADATA_KEY: 'true'}}
+        ssf.sync(local_files, 'bucket', 'v/new', 'v/old', CACHE_CONTROL)
+    s3.head_object.assert_called_once_with(Bucket='bucket', Key='v/old/static/js/older.3.js')
+    s3.copy_object.assert_not_called()
@@ -20,9 +20,9 @@ for ((i = 1; i <= DEPLOYMENTS; i++)); do
     # Navigate to the CDK stack directory
     cd ../cdk-stack
 
-    # Deploy the CDK stack
+    # Deploy the CDK stacks
     echo "Deploying..."
-    cdk deploy --require-approval=never
+    cdk deploy --all --require-approval=never
 
     # Run the script to propagate the API URL
     echo "Propagating API URL..."